@@ -3,11 +3,306 @@ Optimized Order Book Implementation
 
 This implementation uses efficient data structures to improve performance:
 - Dictionary for O(1) order ID lookup
-- Dictionary for O(1) price level access
-- Heaps for O(log n) insertion and O(1) best bid/ask retrieval
+- Sorted price-level maps (SortedDict) for O(1) price level access, O(log n)
+  level insertion/removal and deterministic best bid/ask retrieval
+- Integer price ticks (fixed-point) as keys instead of floats, so dict probes
+  and key comparisons are pure integer operations
+- Integer side codes (BID/ASK) instead of "bid"/"ask" strings
+- A __slots__ Order record that add_order reads by attribute instead of by key
+- Structure-of-Arrays (SoA) order storage in preallocated NumPy columns, with
+  each price level kept as an intrusive circular doubly linked list of slots
+  around a sentinel slot, so cancels unlink in O(1) without branches
+- Single add/amend/delete calls stay in plain Python (no per-call dispatch
+  into compiled code), while a batch API (apply_events) applies a whole feed
+  of events in one Numba-compiled loop, and a vectorized snapshot loader
+  (add_orders_batch) goes through it
+- BoundedOrderBook: for prices on a known bounded tick grid, price levels are
+  found by direct indexing into flat per-tick arrays instead of hashing
+- Optional fixed-size order pool (max_live_orders) so a steady add/cancel flow
+  never allocates or copies columns
+- Top-N depth snapshots (top_n_bids/top_n_asks) as contiguous NumPy arrays
+- Optional aggregate_only mode that keeps only a total quantity and order count
+  per price level instead of time priority
 """
 
-import heapq
+from itertools import chain
+from math import floor, ulp
+from operator import index
+
+import numpy as np
+from numba import njit
+from sortedcontainers import SortedDict
+
+
+# Side codes, accepted by the API and stored in the int8 side column
+BID = 0
+ASK = 1
+
+# Accepted side values -> side code ("bid"/"ask" are converted once at the boundary)
+_SIDE_CODES = {BID: BID, ASK: ASK, "bid": BID, "ask": ASK}
+
+# Event codes accepted by apply_events
+OP_ADD = 0
+OP_AMEND = 1
+OP_DELETE = 2
+
+# Kernel return codes (_NO_LEVEL also marks an empty tick in BoundedOrderBook)
+_NO_LEVEL = -1  # add: the price level does not exist yet / delete: level still has orders
+_REJECTED = -2  # add: order ID already exists / delete: order ID not found
+
+# Marks an order ID with no slot in the batch kernel's ID -> slot array
+_NO_SLOT = -1
+
+# Range of the int64 order_ids, price and qty columns
+_INT64_MIN = -2**63
+_INT64_MAX = 2**63 - 1
+
+# Empty price levels are dropped in bulk once they exceed this fraction of the slots in use
+_COMPACT_DEAD_FRACTION = 0.25
+
+
+@njit(cache=True)
+def _claim_slot(free_slots, free_count):
+    """Pop a slot off the free-list stack. The caller guarantees one is available."""
+    free_count[0] -= 1
+    return free_slots[free_count[0]]
+
+
+@njit(cache=True)
+def _release_slot(free_slots, free_count, slot):
+    """Push a slot back onto the free-list stack."""
+    free_slots[free_count[0]] = slot
+    free_count[0] += 1
+
+
+@njit(cache=True)
+def _open_level(order_ids, price, qty, side, next_at_level, prev_at_level,
+                free_slots, free_count, ticks, side_code):
+    """Claim a sentinel slot for a new, empty price level and return it."""
+    sentinel = _claim_slot(free_slots, free_count)
+    order_ids[sentinel] = 0  # order count
+    price[sentinel] = ticks
+    qty[sentinel] = 0  # total quantity
+    side[sentinel] = side_code
+    next_at_level[sentinel] = sentinel
+    prev_at_level[sentinel] = sentinel
+    return sentinel
+
+
+@njit(cache=True)
+def _add_order_kernel(order_ids, price, qty, side, next_at_level, prev_at_level, level_of,
+                      free_slots, free_count, slot_of, key,
+                      order_id, ticks, quantity, side_code, sentinel):
+    """
+    Store an order in a free slot, append it to its price level and add it to
+    the level's totals.
+    
+    slot_of[key] is the slot of the order ID (_NO_SLOT if it is not in the book).
+    Returns the sentinel of the level the order joined (opening the level if
+    sentinel is _NO_LEVEL), or _REJECTED if the order ID already exists.
+    """
+    if slot_of[key] != _NO_SLOT:
+        return _REJECTED
+    if sentinel == _NO_LEVEL:
+        sentinel = _open_level(order_ids, price, qty, side, next_at_level, prev_at_level,
+                               free_slots, free_count, ticks, side_code)
+    
+    slot = _claim_slot(free_slots, free_count)
+    order_ids[slot] = order_id
+    price[slot] = ticks
+    qty[slot] = quantity
+    side[slot] = side_code
+    level_of[slot] = sentinel
+    slot_of[key] = slot
+    
+    qty[sentinel] += quantity
+    order_ids[sentinel] += 1
+    
+    # Append to the tail of the price level (FIFO time priority)
+    tail = prev_at_level[sentinel]
+    next_at_level[tail] = slot
+    prev_at_level[slot] = tail
+    next_at_level[slot] = sentinel
+    prev_at_level[sentinel] = slot
+    return sentinel
+
+
+@njit(cache=True)
+def _amend_order_kernel(qty, level_of, slot_of, key, quantity):
+    """
+    Overwrite an order's quantity and adjust its level's total.
+    
+    Returns False if the order ID is unknown.
+    """
+    slot = slot_of[key]
+    if slot == _NO_SLOT:
+        return False
+    qty[level_of[slot]] += quantity - qty[slot]
+    qty[slot] = quantity
+    return True
+
+
+@njit(cache=True)
+def _delete_order_kernel(order_ids, price, qty, side, next_at_level, prev_at_level, level_of,
+                         free_slots, free_count, slot_of, key):
+    """
+    Unlink an order from its price level, remove it from the level's totals and
+    free its slot.
+    
+    Returns the sentinel of the level if it is now empty (the sentinel itself is
+    not released), _NO_LEVEL if the level still has orders, or _REJECTED if the
+    order ID is unknown.
+    """
+    slot = slot_of[key]
+    if slot == _NO_SLOT:
+        return _REJECTED
+    slot_of[key] = _NO_SLOT
+    
+    sentinel = level_of[slot]
+    qty[sentinel] -= qty[slot]
+    order_ids[sentinel] -= 1
+    
+    # Unlink the slot from its price level; the sentinel makes this branch-free
+    prev_slot = prev_at_level[slot]
+    next_slot = next_at_level[slot]
+    next_at_level[prev_slot] = next_slot
+    prev_at_level[next_slot] = prev_slot
+    _release_slot(free_slots, free_count, slot)
+    
+    if order_ids[sentinel] == 0:
+        return sentinel
+    return _NO_LEVEL
+
+
+# Aggregate-only variants: orders are not linked into their level and only
+# count towards its totals (amends go through _amend_order_kernel).
+
+@njit(cache=True)
+def _add_order_aggregate_kernel(order_ids, price, qty, side, next_at_level, prev_at_level,
+                                level_of, free_slots, free_count, slot_of, key,
+                                order_id, ticks, quantity, side_code, sentinel):
+    """Store an order in a free slot and add it to its level's totals; see _add_order_kernel."""
+    if slot_of[key] != _NO_SLOT:
+        return _REJECTED
+    if sentinel == _NO_LEVEL:
+        sentinel = _open_level(order_ids, price, qty, side, next_at_level, prev_at_level,
+                               free_slots, free_count, ticks, side_code)
+    
+    slot = _claim_slot(free_slots, free_count)
+    order_ids[slot] = order_id
+    price[slot] = ticks
+    qty[slot] = quantity
+    side[slot] = side_code
+    level_of[slot] = sentinel
+    slot_of[key] = slot
+    
+    qty[sentinel] += quantity
+    order_ids[sentinel] += 1
+    return sentinel
+
+
+@njit(cache=True)
+def _delete_order_aggregate_kernel(order_ids, price, qty, side, next_at_level, prev_at_level,
+                                   level_of, free_slots, free_count, slot_of, key):
+    """Remove an order from its level's totals and free its slot; see _delete_order_kernel."""
+    slot = slot_of[key]
+    if slot == _NO_SLOT:
+        return _REJECTED
+    slot_of[key] = _NO_SLOT
+    
+    sentinel = level_of[slot]
+    qty[sentinel] -= qty[slot]
+    order_ids[sentinel] -= 1
+    _release_slot(free_slots, free_count, slot)
+    
+    if order_ids[sentinel] == 0:
+        return sentinel
+    return _NO_LEVEL
+
+
+@njit(cache=True)
+def _apply_events_kernel(order_ids, price, qty, side, next_at_level, prev_at_level, level_of,
+                         free_slots, free_count, slot_of, id_keys,
+                         op_codes, ids, prices_ticks, qtys, sides,
+                         level_of_event, level_sentinels, order_room,
+                         applied, emptied, aggregate_only):
+    """
+    Apply a batch of add/amend/delete events in order.
+    
+    Order IDs are looked up through slot_of, which holds the slot of each
+    distinct ID in the batch (_NO_SLOT if absent); id_keys[i] is the index of
+    event i's ID in slot_of. Likewise level_sentinels holds the sentinel of each
+    distinct price level the adds use (_NO_LEVEL until an add opens it) and
+    level_of_event[i] is add event i's index into it. order_room is how many
+    more live orders the book may hold: an add is refused once it reaches zero,
+    and a delete makes room again. applied[i] records whether event i took
+    effect and emptied[i] the sentinel of a level left empty by delete event i
+    (or _NO_LEVEL).
+    """
+    for i in range(len(op_codes)):
+        emptied[i] = _NO_LEVEL
+        op = op_codes[i]
+        key = id_keys[i]
+        if op == OP_ADD:
+            # No room for another live order (max_live_orders)
+            if order_room == 0:
+                applied[i] = False
+                continue
+            level = level_of_event[i]
+            if aggregate_only:
+                result = _add_order_aggregate_kernel(
+                    order_ids, price, qty, side, next_at_level, prev_at_level,
+                    level_of, free_slots, free_count, slot_of, key, ids[i], prices_ticks[i],
+                    qtys[i], sides[i], level_sentinels[level])
+            else:
+                result = _add_order_kernel(
+                    order_ids, price, qty, side, next_at_level, prev_at_level,
+                    level_of, free_slots, free_count, slot_of, key, ids[i], prices_ticks[i],
+                    qtys[i], sides[i], level_sentinels[level])
+            applied[i] = result != _REJECTED
+            if applied[i]:
+                # Later adds at this price join the level this add may have opened
+                level_sentinels[level] = result
+                order_room -= 1
+        elif op == OP_AMEND:
+            applied[i] = _amend_order_kernel(qty, level_of, slot_of, key, qtys[i])
+        elif op == OP_DELETE:
+            if aggregate_only:
+                result = _delete_order_aggregate_kernel(
+                    order_ids, price, qty, side, next_at_level, prev_at_level,
+                    level_of, free_slots, free_count, slot_of, key)
+            else:
+                result = _delete_order_kernel(
+                    order_ids, price, qty, side, next_at_level, prev_at_level,
+                    level_of, free_slots, free_count, slot_of, key)
+            applied[i] = result != _REJECTED
+            if applied[i]:
+                order_room += 1
+            if result >= 0:
+                emptied[i] = result
+        else:
+            applied[i] = False
+
+
+class Order:
+    """
+    Order record with fixed attributes, accepted by add_order in place of a dict.
+    
+    __slots__ gives direct attribute slots instead of a per-instance dict, so
+    reading a field is an offset load rather than a string-key hash and probe.
+    """
+    
+    __slots__ = ("order_id", "price", "quantity", "side")
+    
+    def __init__(self, order_id, price, quantity, side):
+        self.order_id = order_id
+        self.price = price
+        self.quantity = quantity
+        self.side = side
+    
+    def __repr__(self):
+        return (f"Order(order_id={self.order_id}, price={self.price}, "
+                f"quantity={self.quantity}, side={self.side})")
 
 
 class OptimizedOrderBook:
@@ -15,75 +310,536 @@ class OptimizedOrderBook:
     An optimized order book implementation using efficient data structures.
     
     Data Structures:
-    - orders_by_id: dict mapping order_id -> order dict (O(1) lookup)
-    - bids_by_price: dict mapping price -> list of orders at that price (O(1) access)
-    - asks_by_price: dict mapping price -> list of orders at that price (O(1) access)
-    - bid_heap: min-heap of NEGATED bid prices (allows O(log n) insertion, best bid is heap[0] when negated)
-    - ask_heap: min-heap of ask prices (allows O(log n) insertion, best ask is heap[0])
+    - order_ids, price, qty, side: parallel NumPy columns indexed by a dense slot id
+      (price holds integer ticks, side holds BID/ASK)
+    - next_at_level, prev_at_level: int32 columns linking the slots of one price level
+      into a FIFO circular doubly linked list (time priority)
+    - level_of: int32 column holding the sentinel slot of each order's price level
+    - orders_by_id: dict mapping order_id -> slot (O(1) lookup)
+    - bid_levels: SortedDict mapping price ticks -> sentinel slot of that level
+      (O(1) access by price, best bid is the last key)
+    - ask_levels: SortedDict mapping price ticks -> sentinel slot of that level
+      (O(1) access by price, best ask is the first key)
+    
+    Every price level owns a sentinel slot that holds no order: the level's head is
+    next_at_level[sentinel] and its tail is prev_at_level[sentinel]. An order is
+    unlinked with two stores and the level is empty once the sentinel links to itself.
+    The sentinel also keeps the level's total quantity in qty and its order
+    count in order_ids, updated on every add, amend and delete, so depth reads
+    never walk the orders.
+    
+    Single add/amend/delete calls update the columns and orders_by_id in plain
+    Python: one order is a handful of stores, which costs less than a call
+    into compiled code. They index the columns through memoryviews (_views),
+    which read and write plain ints instead of boxing NumPy scalars.
+    apply_events and add_orders_batch run the whole batch in the @njit kernels
+    at module level instead, on the same arrays. The class converts
+    arguments at the boundary, makes room in the columns and keeps the
+    SortedDicts in step when levels open or close.
+    The price-level index is only accessed through _find_level, _insert_level,
+    _remove_level, _best_level and _levels_from_best, which BoundedOrderBook
+    overrides.
+    The first batch compiles the kernels (cached on disk afterwards).
+    
+    Prices are converted to integer ticks (price / tick_size, rounded; computed as a
+    multiply by the precomputed 1 / tick_size) before being stored.
+    Orders are returned as dicts rebuilt from their slot, so the price is
+    reconstructed from ticks, the side is a BID/ASK code and the dict is a
+    snapshot, not a live view.
+    
+    Slots are allocated from a free-list stack; the columns double in size when
+    the stack runs out. With max_live_orders set the book holds at most that many
+    orders: the pool is sized once up front (a slot per order plus, at worst, a
+    sentinel per order) and never grows, so adds and deletes only push and pop
+    the stack (no allocation, no column copies). A single add past the limit
+    raises ValueError and a batch add past it is not applied.
+    
+    Empty price levels are closed lazily: a level that empties stays in the
+    index, marked dead, so cancel/replace churn at a price does not remove and
+    re-insert it. Dead levels are dropped in one pass (_compact) once they exceed
+    _COMPACT_DEAD_FRACTION of the slots in use, when slots run out, or as soon as
+    they reach the top of their side, so the best bid/ask always has orders and
+    there are no stale prices to clean up when reading it. The best level of
+    each side is cached (_best_bid_price/_best_bid_level and the ask
+    equivalents): opening a level only compares against the cached price, and
+    only closing the best level consults the SortedDict for the next one.
+    
+    With aggregate_only=True, time priority is not tracked: orders are not linked
+    into their level and only count towards its totals. get_orders_at_price then
+    returns (total_quantity, order_count) and get_best_bid/get_best_ask return
+    the best level's aggregate instead of its first order.
     
     Time Complexities:
-    - add_order: O(log n) - heap insertion
-    - amend_order: O(1) - dictionary lookup and update
-    - delete_order: O(log n) amortized - lazy deletion from heap + list.remove O(k) where k is orders at price
+    - add_order: O(1) into an existing level, O(log n) when it opens a new price level
+    - amend_order: O(1) - dictionary lookup and a single array store
+    - delete_order: O(1), O(log n) when it empties the best price level
+      (other emptied levels are dropped later in an amortized compaction)
+    - apply_events: O(m) compiled loop for m events, plus O(log n) per level opened/dropped
+    - add_orders_batch: O(m) for m orders, as one apply_events batch of adds
     - lookup_order: O(1) - dictionary lookup
-    - get_orders_at_price: O(1) - dictionary lookup
-    - get_best_bid/get_best_ask: O(log n) amortized - heap cleanup of deleted prices
+    - get_orders_at_price: O(k) - walk of the k orders at that price level
+    - get_orders_at_price_view: O(1) to start, O(1) per order yielded
+    - get_best_bid/get_best_ask: O(1) - cached best level, no lookup needed
+    - top_n_bids/top_n_asks: O(n) walk from the best level, totals read off the sentinels
     """
     
-    def __init__(self):
-        """Initialize empty data structures."""
+    def __init__(self, capacity=1024, aggregate_only=False, max_live_orders=None,
+                 tick_size=1e-4):
+        """
+        Initialize empty data structures.
+        
+        Args:
+            capacity (int): Number of order slots to preallocate
+            aggregate_only (bool): Keep only per-level totals instead of time priority
+            max_live_orders (int, optional): If given, allow at most this many live
+                orders and preallocate a fixed pool for them (overrides capacity)
+                that never grows
+            tick_size (float): Price increment of one tick
+        """
+        # An empty column can never double into room for an order
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        
+        self.aggregate_only = aggregate_only
+        
+        # A fixed pool needs a slot per order plus, at worst, a sentinel per order
+        self.max_live_orders = max_live_orders
+        if max_live_orders is not None:
+            if max_live_orders < 1:
+                raise ValueError(f"max_live_orders must be at least 1, got {max_live_orders}")
+            capacity = 2 * max_live_orders
+        
+        # Price -> ticks is a multiply by the precomputed reciprocal, not a divide.
+        # 1 / tick_size can land an ulp off the integer it should be (1 / 1e-5 is
+        # 99999.99999999999), so snap it, or ticks / _inv_tick would rebuild 100.0
+        # as 100.00000000000001
+        self.tick_size = tick_size
+        inv_tick = 1.0 / tick_size
+        nearest = round(inv_tick)
+        if nearest and abs(inv_tick - nearest) <= 4 * ulp(nearest):
+            inv_tick = float(nearest)
+        self._inv_tick = inv_tick
+        
+        # SoA order storage, one entry per slot
+        self.order_ids = np.empty(capacity, dtype=np.int64)
+        self.price = np.empty(capacity, dtype=np.int64)  # price ticks
+        self.qty = np.empty(capacity, dtype=np.int64)
+        self.side = np.empty(capacity, dtype=np.int8)
+        self.next_at_level = np.empty(capacity, dtype=np.int32)
+        self.prev_at_level = np.empty(capacity, dtype=np.int32)
+        self.level_of = np.empty(capacity, dtype=np.int32)
+        
+        # Stack of unused slots (top is free_slots[free_count[0] - 1]);
+        # lowest slot ids are handed out first
+        self._free_slots = np.arange(capacity - 1, -1, -1, dtype=np.int32)
+        self._free_count = np.array([capacity], dtype=np.int64)
+        
         # O(1) lookup by order ID
         self.orders_by_id = {}
         
-        # O(1) access to orders at a price level
-        self.bids_by_price = {}  # price -> list of orders
-        self.asks_by_price = {}  # price -> list of orders
+        # Price levels kept sorted by ticks for best bid/ask retrieval
+        self.bid_levels = SortedDict()  # price ticks -> sentinel slot
+        self.ask_levels = SortedDict()  # price ticks -> sentinel slot
+        
+        # Empty price levels still in the index (closed lazily, see _close_level)
+        self._dead_levels = set()
+        
+        # Best levels, kept up to date as levels open and close
+        # (price ticks are None and the sentinel _NO_LEVEL while a side is empty)
+        self._best_bid_price = None
+        self._best_bid_level = _NO_LEVEL
+        self._best_ask_price = None
+        self._best_ask_level = _NO_LEVEL
+        
+        self._bind_columns()
+    
+    def _bind_columns(self):
+        """Cache the argument tuple the kernels take and memoryviews over the same arrays."""
+        self._columns = (
+            self.order_ids, self.price, self.qty, self.side,
+            self.next_at_level, self.prev_at_level, self.level_of,
+            self._free_slots, self._free_count,
+        )
+        self._views = tuple(memoryview(column) for column in self._columns[:7])
+        self._free_view = memoryview(self._free_slots)
+        self._free_count_view = memoryview(self._free_count)
+    
+    @staticmethod
+    def _side_code(side):
+        """
+        Convert a side argument to its side code.
+        
+        Args:
+            side: BID, ASK, "bid" or "ask"
+            
+        Returns:
+            int: BID or ASK
+        """
+        side_code = _SIDE_CODES.get(side)
+        if side_code is None:
+            raise ValueError(f"Invalid side: {side}. Must be BID or ASK")
+        return side_code
+    
+    def _to_ticks(self, price):
+        """
+        Convert a float price to integer ticks.
+        
+        Args:
+            price (float): Order price
+            
+        Returns:
+            int: Price expressed in units of tick_size (rounded to the nearest tick)
+        """
+        return floor(price * self._inv_tick + 0.5)
+    
+    def _grow(self):
+        """Double the capacity of every column and add the new slots to the free list."""
+        old_capacity = len(self.qty)
+        new_capacity = old_capacity * 2
+        self.order_ids = self._resized(self.order_ids, new_capacity)
+        self.price = self._resized(self.price, new_capacity)
+        self.qty = self._resized(self.qty, new_capacity)
+        self.side = self._resized(self.side, new_capacity)
+        self.next_at_level = self._resized(self.next_at_level, new_capacity)
+        self.prev_at_level = self._resized(self.prev_at_level, new_capacity)
+        self.level_of = self._resized(self.level_of, new_capacity)
+        
+        free_count = self._free_count[0]
+        self._free_slots = self._resized(self._free_slots, new_capacity)
+        self._free_slots[free_count:free_count + old_capacity] = np.arange(
+            new_capacity - 1, old_capacity - 1, -1)
+        self._free_count[0] = free_count + old_capacity
+        
+        self._bind_columns()
+    
+    def _reserve(self, num_slots):
+        """Compact dead levels or grow the columns until at least num_slots slots are free."""
+        while self._free_count_view[0] < num_slots:
+            if self._dead_levels:
+                # Recheck before growing: the dropped levels may have freed enough
+                self._compact()
+            elif self.max_live_orders is not None:
+                raise ValueError(f"Order pool is full (max_live_orders={self.max_live_orders})")
+            else:
+                self._grow()
+    
+    @staticmethod
+    def _resized(column, new_capacity):
+        """Return a copy of column with room for new_capacity entries."""
+        grown = np.empty(new_capacity, dtype=column.dtype)
+        grown[:len(column)] = column
+        return grown
+    
+    def _find_level(self, side_code, ticks):
+        """
+        Look up a price level.
+        
+        Args:
+            side_code (int): BID or ASK
+            ticks (int): Price in ticks
+            
+        Returns:
+            int: Sentinel slot of the level, or _NO_LEVEL if it is not open
+        """
+        if side_code == BID:
+            return self.bid_levels.get(ticks, _NO_LEVEL)
+        return self.ask_levels.get(ticks, _NO_LEVEL)
+    
+    def _insert_level(self, side_code, ticks, sentinel):
+        """Register a newly opened price level under its price."""
+        if side_code == BID:
+            self.bid_levels[ticks] = sentinel
+            if self._best_bid_price is None or ticks > self._best_bid_price:
+                self._best_bid_price = ticks
+                self._best_bid_level = sentinel
+        else:
+            self.ask_levels[ticks] = sentinel
+            if self._best_ask_price is None or ticks < self._best_ask_price:
+                self._best_ask_price = ticks
+                self._best_ask_level = sentinel
+    
+    def _remove_level(self, side_code, ticks):
+        """Drop an empty price level from the index."""
+        if side_code == BID:
+            del self.bid_levels[ticks]
+            if ticks == self._best_bid_price:
+                # Next best is the new last key
+                if self.bid_levels:
+                    self._best_bid_price, self._best_bid_level = self.bid_levels.peekitem(-1)
+                else:
+                    self._best_bid_price, self._best_bid_level = None, _NO_LEVEL
+        else:
+            del self.ask_levels[ticks]
+            if ticks == self._best_ask_price:
+                # Next best is the new first key
+                if self.ask_levels:
+                    self._best_ask_price, self._best_ask_level = self.ask_levels.peekitem(0)
+                else:
+                    self._best_ask_price, self._best_ask_level = None, _NO_LEVEL
+    
+    def _best_level(self, side_code):
+        """
+        Find the best price level of a side.
+        
+        Args:
+            side_code (int): BID or ASK
+            
+        Returns:
+            int: Sentinel slot of the highest bid / lowest ask level, or _NO_LEVEL
+        """
+        if side_code == BID:
+            return self._best_bid_level
+        return self._best_ask_level
+    
+    def _levels_from_best(self, side_code):
+        """
+        Walk the price levels of a side from the best outwards.
         
-        # Heaps for efficient best bid/ask retrieval
-        # bid_heap stores negated prices (min-heap of negated = max-heap of actual prices)
-        # ask_heap stores prices directly (min-heap)
-        self.bid_heap = []
-        self.ask_heap = []
+        Args:
+            side_code (int): BID or ASK
+            
+        Yields:
+            int: Sentinel slots, highest bid / lowest ask first (dead levels included)
+        """
+        levels = self.bid_levels if side_code == BID else self.ask_levels
+        for ticks in (reversed(levels) if side_code == BID else levels):
+            yield levels[ticks]
     
-    def add_order(self, order_dict):
+    def _close_level(self, sentinel):
+        """
+        Retire a price level that just became empty.
+        
+        The level stays in the index, marked dead, so a new order at the same
+        price links straight back into it. Only the best level is dropped right
+        away (along with any dead levels behind it), so the best bid/ask always
+        has orders.
+        
+        Args:
+            sentinel (int): Sentinel slot of the empty price level
+        """
+        self._dead_levels.add(sentinel)
+        
+        # Levels behind the best need no cleanup: the best still has orders
+        side_code = self._views[3][sentinel]
+        if sentinel == self._best_level(side_code):
+            self._settle_best(side_code)
+        self._compact_if_needed()
+    
+    def _settle_best(self, side_code):
+        """Drop empty levels from the top of a side until its best level has orders."""
+        sentinel = self._best_level(side_code)
+        while sentinel != _NO_LEVEL and self._level_is_empty(sentinel):
+            self._drop_level(sentinel)
+            sentinel = self._best_level(side_code)
+    
+    def _drop_level(self, sentinel):
+        """Remove an empty price level from the index and free its sentinel."""
+        self._dead_levels.discard(sentinel)
+        _, price, _, side, _, _, _ = self._views
+        self._remove_level(side[sentinel], price[sentinel])
+        self._push_free_slot(sentinel)
+    
+    def _pop_free_slot(self):
+        """Take a slot off the free-list stack. The caller guarantees one is available."""
+        count = self._free_count_view[0] - 1
+        self._free_count_view[0] = count
+        return self._free_view[count]
+    
+    def _push_free_slot(self, slot):
+        """Return a slot to the free-list stack."""
+        count = self._free_count_view[0]
+        self._free_view[count] = slot
+        self._free_count_view[0] = count + 1
+    
+    def _new_level(self, side_code, ticks):
+        """
+        Open an empty price level and register it in the index.
+        
+        Args:
+            side_code (int): BID or ASK
+            ticks (int): Price in ticks
+            
+        Returns:
+            int: Sentinel slot of the new level
+        """
+        order_ids, price, qty, side, next_at_level, prev_at_level, _ = self._views
+        sentinel = self._pop_free_slot()
+        order_ids[sentinel] = 0  # order count
+        price[sentinel] = ticks
+        qty[sentinel] = 0  # total quantity
+        side[sentinel] = side_code
+        next_at_level[sentinel] = sentinel
+        prev_at_level[sentinel] = sentinel
+        self._insert_level(side_code, ticks, sentinel)
+        return sentinel
+    
+    def _compact_if_needed(self):
+        """Compact once dead levels exceed _COMPACT_DEAD_FRACTION of the slots in use."""
+        # Slots in use are the live orders plus one sentinel per level
+        slots_in_use = len(self.qty) - self._free_count_view[0]
+        if len(self._dead_levels) > _COMPACT_DEAD_FRACTION * slots_in_use:
+            self._compact()
+    
+    def _compact(self):
+        """Drop every dead price level in one pass."""
+        # Refilled levels leave _dead_levels on their add, so every one is empty
+        for sentinel in list(self._dead_levels):
+            self._drop_level(sentinel)
+    
+    def _level_is_empty(self, sentinel):
+        """Return True if the price level has no orders left."""
+        return self._views[0][sentinel] == 0
+    
+    def _level_at(self, sentinel):
+        """
+        Build the aggregate dict for a price level (aggregate_only).
+        
+        Args:
+            sentinel (int): Sentinel slot of the price level
+            
+        Returns:
+            dict: Level dictionary with price, quantity, order_count and side
+        """
+        order_ids, price, qty, side, _, _, _ = self._views
+        return {
+            "price": price[sentinel] / self._inv_tick,
+            "quantity": qty[sentinel],
+            "order_count": order_ids[sentinel],
+            "side": side[sentinel],
+        }
+    
+    def _order_at(self, slot):
+        """
+        Build the order dict for a slot.
+        
+        Args:
+            slot (int): Slot holding the order
+            
+        Returns:
+            dict: Order dictionary with order_id, price, quantity and side
+        """
+        order_ids, price, qty, side, _, _, _ = self._views
+        return {
+            "order_id": order_ids[slot],
+            "price": price[slot] / self._inv_tick,
+            "quantity": qty[slot],
+            "side": side[slot],
+        }
+    
+    def _iter_level(self, sentinel):
+        """
+        Walk the orders of a price level in time priority.
+        
+        Args:
+            sentinel (int): Sentinel slot of the price level
+            
+        Yields:
+            dict: Order dicts from oldest to newest
+        """
+        next_at_level = self._views[4]
+        slot = next_at_level[sentinel]
+        while slot != sentinel:
+            yield self._order_at(slot)
+            slot = next_at_level[slot]
+    
+    def _levels_at(self, price, side):
+        """
+        Find the open price levels at a price.
+        
+        Args:
+            price (float): The price level to query
+            side (int or None): BID, ASK, or None for both sides
+            
+        Returns:
+            list: Sentinel slots of the levels found, bid before ask
+        """
+        ticks = self._to_ticks(price)
+        side_codes = (BID, ASK) if side is None else (self._side_code(side),)
+        sentinels = []
+        
+        for side_code in side_codes:
+            sentinel = self._find_level(side_code, ticks)
+            if sentinel != _NO_LEVEL:
+                sentinels.append(sentinel)
+        
+        return sentinels
+    
+    def add_order(self, order):
         """
         Add an order to the appropriate structures.
         
         Args:
-            order_dict: Dictionary with keys:
+            order: Order, or a dictionary with keys:
                 - order_id (int): Unique order identifier
                 - price (float): Order price
                 - quantity (int): Order quantity
-                - side (str): "bid" or "ask"
+                - side (int): BID or ASK ("bid"/"ask" also accepted)
+        """
+        # Unpack once at the boundary
+        if isinstance(order, Order):
+            order_id, price, quantity, side = (
+                order.order_id, order.price, order.quantity, order.side)
+        else:
+            order_id, price, quantity, side = (
+                order["order_id"], order["price"], order["quantity"], order["side"])
+        
+        # _to_ticks and _side_code inlined, as this runs once per order
+        side_code = _SIDE_CODES.get(side)
+        if side_code is None:
+            raise ValueError(f"Invalid side: {side}. Must be BID or ASK")
+        self._add(order_id, floor(price * self._inv_tick + 0.5), quantity, side_code)
+    
+    def _add(self, order_id, ticks, quantity, side_code):
         """
-        order_id = order_dict["order_id"]
-        price = order_dict["price"]
-        side = order_dict["side"]
+        Add an order given in internal units.
         
+        Args:
+            order_id (int): Unique order identifier
+            ticks (int): Price in ticks
+            quantity (int): Order quantity
+            side_code (int): BID or ASK
+        """
+        # Check every value against its int64 column first: once a level is
+        # opened and slots are taken, a failing store would leave the book corrupt
+        order_id, ticks, quantity = index(order_id), index(ticks), index(quantity)
+        if not (_INT64_MIN <= order_id <= _INT64_MAX and _INT64_MIN <= ticks <= _INT64_MAX
+                and _INT64_MIN <= quantity <= _INT64_MAX):
+            raise ValueError("order_id, price ticks and quantity must fit in int64")
         if order_id in self.orders_by_id:
             raise ValueError(f"Order ID {order_id} already exists")
+        if self.max_live_orders is not None and len(self.orders_by_id) >= self.max_live_orders:
+            raise ValueError(f"Order pool is full (max_live_orders={self.max_live_orders})")
         
-        # Store order in orders_by_id for O(1) lookup
-        self.orders_by_id[order_id] = order_dict
-        
-        if side == "bid":
-            # Add to bids_by_price
-            if price not in self.bids_by_price:
-                self.bids_by_price[price] = []
-                # Insert negated price into min-heap (for max-heap behavior)
-                negated_price = -price
-                heapq.heappush(self.bid_heap, negated_price)
-            self.bids_by_price[price].append(order_dict)
-            
-        elif side == "ask":
-            # Add to asks_by_price
-            if price not in self.asks_by_price:
-                self.asks_by_price[price] = []
-                # Insert price into min-heap
-                heapq.heappush(self.ask_heap, price)
-            self.asks_by_price[price].append(order_dict)
-        else:
-            raise ValueError(f"Invalid side: {side}. Must be 'bid' or 'ask'")
+        # Room for the order and, if needed, a new level's sentinel (before the
+        # lookup, since making room may compact dead levels away)
+        if self._free_count_view[0] < 2:
+            self._reserve(2)
+        sentinel = self._find_level(side_code, ticks)
+        if sentinel == _NO_LEVEL:
+            sentinel = self._new_level(side_code, ticks)
+        
+        order_ids, price, qty, side, next_at_level, prev_at_level, level_of = self._views
+        slot = self._pop_free_slot()
+        order_ids[slot] = order_id
+        price[slot] = ticks
+        qty[slot] = quantity
+        side[slot] = side_code
+        level_of[slot] = sentinel
+        self.orders_by_id[order_id] = slot
+        
+        count = order_ids[sentinel]
+        if count == 0:
+            # A dead level that gets an order is live again
+            self._dead_levels.discard(sentinel)
+        qty[sentinel] += quantity
+        order_ids[sentinel] = count + 1
+        if not self.aggregate_only:
+            # Append to the tail of the price level (FIFO time priority)
+            tail = prev_at_level[sentinel]
+            next_at_level[tail] = slot
+            prev_at_level[slot] = tail
+            next_at_level[slot] = sentinel
+            prev_at_level[sentinel] = slot
     
     def amend_order(self, order_id, new_quantity):
         """
@@ -97,13 +853,15 @@ class OptimizedOrderBook:
         Returns:
             bool: True if order was found and amended, False otherwise
         """
-        if order_id not in self.orders_by_id:
+        slot = self.orders_by_id.get(order_id)
+        if slot is None:
             return False
         
-        # O(1) lookup and update
-        order = self.orders_by_id[order_id]
-        order["quantity"] = new_quantity
-        
+        qty = self._views[2]
+        old_quantity = qty[slot]
+        # The order's own store first, so a quantity it rejects changes nothing
+        qty[slot] = new_quantity
+        qty[self._views[6][slot]] += new_quantity - old_quantity
         return True
     
     def delete_order(self, order_id):
@@ -116,38 +874,207 @@ class OptimizedOrderBook:
         Returns:
             bool: True if order was found and deleted, False otherwise
         """
-        if order_id not in self.orders_by_id:
+        slot = self.orders_by_id.pop(order_id, None)
+        if slot is None:
             return False
         
-        order = self.orders_by_id[order_id]
-        price = order["price"]
-        side = order["side"]
-        
-        # Remove from orders_by_id
-        del self.orders_by_id[order_id]
-        
-        if side == "bid":
-            # Remove from bids_by_price
-            if price in self.bids_by_price:
-                self.bids_by_price[price].remove(order)
-                # If no more orders at this price, remove price level
-                # Note: We use lazy deletion - the price stays in the heap but gets cleaned up
-                # when we access get_best_bid() and it's no longer in bids_by_price
-                if not self.bids_by_price[price]:
-                    del self.bids_by_price[price]
-        
-        elif side == "ask":
-            # Remove from asks_by_price
-            if price in self.asks_by_price:
-                self.asks_by_price[price].remove(order)
-                # If no more orders at this price, remove price level
-                # Note: We use lazy deletion - the price stays in the heap but gets cleaned up
-                # when we access get_best_ask() and it's no longer in asks_by_price
-                if not self.asks_by_price[price]:
-                    del self.asks_by_price[price]
+        order_ids, _, qty, _, next_at_level, prev_at_level, level_of = self._views
+        sentinel = level_of[slot]
+        qty[sentinel] -= qty[slot]
+        order_ids[sentinel] -= 1
+        if not self.aggregate_only:
+            # Unlink the slot from its price level; the sentinel makes this branch-free
+            prev_slot = prev_at_level[slot]
+            next_slot = next_at_level[slot]
+            next_at_level[prev_slot] = next_slot
+            prev_at_level[next_slot] = prev_slot
+        self._push_free_slot(slot)
+        
+        # If no more orders at this price, retire the price level
+        if order_ids[sentinel] == 0:
+            self._close_level(sentinel)
         
         return True
     
+    @staticmethod
+    def _event_arrays(op_codes, ids, prices_ticks, qtys, sides):
+        """
+        Convert the apply_events arguments to int64 arrays and validate them.
+        
+        The kernel indexes every array by event and stores add sides unchecked,
+        so mismatched lengths or an add with a side other than BID/ASK raise
+        ValueError before anything is applied. So do non-integer arrays, which
+        a cast to int64 would silently truncate (a float price instead of ticks).
+        
+        Returns:
+            tuple: (op_codes, ids, prices_ticks, qtys, sides) as int64 arrays
+        """
+        arrays = []
+        for values in (op_codes, ids, prices_ticks, qtys, sides):
+            values = np.asarray(values)
+            # An empty list comes in as float64
+            if values.size and not np.issubdtype(values.dtype, np.integer):
+                raise ValueError(f"Event arrays must hold integers, got {values.dtype}")
+            arrays.append(values.astype(np.int64, copy=False))
+        arrays = tuple(arrays)
+        num_events = len(arrays[0])
+        if any(values.shape != (num_events,) for values in arrays):
+            raise ValueError("Event arrays must be one-dimensional and of equal length")
+        
+        add_sides = arrays[4][arrays[0] == OP_ADD]
+        if not np.all((add_sides == BID) | (add_sides == ASK)):
+            raise ValueError("Invalid side in batch. Must be BID or ASK")
+        return arrays
+    
+    def apply_events(self, op_codes, ids, prices_ticks, qtys, sides):
+        """
+        Apply a batch of events in order with a single compiled loop.
+        
+        All arguments are equal-length integer arrays. Fields an event does not
+        use are ignored (amend uses ids and qtys, delete only ids). orders_by_id
+        is read once per distinct order ID before the loop and updated for the
+        IDs the batch added or deleted after it.
+        
+        Args:
+            op_codes: OP_ADD, OP_AMEND or OP_DELETE per event
+            ids: Order ID per event
+            prices_ticks: Price in integer ticks (price / tick_size) per event
+            qtys: Quantity per event
+            sides: BID or ASK per event
+            
+        Returns:
+            np.ndarray: Boolean array, True where the event was applied (False for a
+            duplicate add, an add past max_live_orders, an amend/delete of an
+            unknown ID or an unknown op code)
+            
+        Raises:
+            ValueError: If the arrays are not integer, differ in length or an add
+            event's side is not BID or ASK (nothing is applied)
+        """
+        op_codes, ids, prices_ticks, qtys, sides = self._event_arrays(
+            op_codes, ids, prices_ticks, qtys, sides)
+        num_events = len(op_codes)
+        
+        # Look up every price level the adds need once per distinct level; the
+        # kernel opens the missing ones on their first applied add
+        # (the key packs side into the low bit: ticks * 2 + side)
+        add_events = np.flatnonzero(op_codes == OP_ADD)
+        level_keys, level_of_add = np.unique(
+            prices_ticks[add_events] * 2 + sides[add_events], return_inverse=True)
+        level_keys = level_keys.tolist()
+        
+        # Live orders the batch may still add; the kernel refuses adds beyond
+        # max_live_orders, so it never holds more new orders than this at once.
+        # Each new level takes a sentinel on an applied add, and with the limit
+        # set only order_room adds plus one per delete can be applied
+        order_room = len(add_events)
+        num_applied_adds = order_room
+        if self.max_live_orders is not None:
+            order_room = min(order_room, self.max_live_orders - len(self.orders_by_id))
+            num_applied_adds = min(num_applied_adds,
+                                   order_room + int(np.count_nonzero(op_codes == OP_DELETE)))
+        num_slots = order_room + min(num_applied_adds, len(level_keys))
+        if self.max_live_orders is not None and self._free_count_view[0] < num_slots:
+            if self._dead_levels:
+                self._compact()
+            # Levels the batch empties stay dead until it ends, so a fixed pool
+            # may not hold every level it could open; apply it in halves, which
+            # compacts in between (a single event always fits)
+            if self._free_count_view[0] < num_slots and num_events > 1:
+                half = num_events // 2
+                return np.concatenate((
+                    self.apply_events(op_codes[:half], ids[:half], prices_ticks[:half],
+                                      qtys[:half], sides[:half]),
+                    self.apply_events(op_codes[half:], ids[half:], prices_ticks[half:],
+                                      qtys[half:], sides[half:])))
+        self._reserve(num_slots)
+        
+        initial_levels = [self._find_level(key & 1, key >> 1) for key in level_keys]
+        level_sentinels = np.array(initial_levels, dtype=np.int64)
+        level_of_event = np.full(num_events, _NO_LEVEL, dtype=np.int64)
+        level_of_event[add_events] = level_of_add
+        applied = np.empty(num_events, dtype=np.bool_)
+        emptied = np.empty(num_events, dtype=np.int64)
+        
+        # The kernel sees orders_by_id as a dense array with one slot per distinct
+        # ID in the batch, filled from the dict here and written back afterwards
+        unique_ids, id_keys = np.unique(ids, return_inverse=True)
+        unique_ids = unique_ids.tolist()
+        get_slot = self.orders_by_id.get
+        slot_of = np.array([get_slot(order_id, _NO_SLOT) for order_id in unique_ids],
+                           dtype=np.int64)
+        initial_slots = slot_of.copy()
+        
+        _apply_events_kernel(*self._columns, slot_of, id_keys, op_codes, ids,
+                             prices_ticks, qtys, sides, level_of_event, level_sentinels,
+                             order_room, applied, emptied, self.aggregate_only)
+        
+        # Only IDs the batch added or deleted (net) change in the dict
+        final_slots = slot_of.tolist()
+        for key in np.flatnonzero(slot_of != initial_slots).tolist():
+            if final_slots[key] == _NO_SLOT:
+                del self.orders_by_id[unique_ids[key]]
+            else:
+                self.orders_by_id[unique_ids[key]] = final_slots[key]
+        
+        # Register the levels the kernel opened
+        final_levels = level_sentinels.tolist()
+        for key, initial, sentinel in zip(level_keys, initial_levels, final_levels):
+            if initial == _NO_LEVEL and sentinel != _NO_LEVEL:
+                self._insert_level(key & 1, key >> 1, sentinel)
+        
+        # Retire levels left empty at the end of the batch and revive dead levels
+        # the batch refilled (a level emptied midway may have been refilled by a
+        # later add), then settle both best levels once all of them are marked
+        touched = np.unique(np.concatenate((level_sentinels[level_sentinels >= 0],
+                                            emptied[emptied >= 0])))
+        for sentinel in touched.tolist():
+            if self._level_is_empty(sentinel):
+                self._dead_levels.add(sentinel)
+            else:
+                self._dead_levels.discard(sentinel)
+        self._settle_best(BID)
+        self._settle_best(ASK)
+        self._compact_if_needed()
+        
+        return applied
+    
+    def add_orders_batch(self, orders):
+        """
+        Add many orders at once, e.g. when loading a book snapshot.
+        
+        Prices are converted to ticks and sides to codes with whole-array NumPy
+        operations, then the orders go through apply_events as one batch of adds, so
+        each distinct price level is looked up or opened once. Orders sharing a
+        price level keep their time priority in array order.
+        
+        Args:
+            orders: NumPy structured array with fields order_id, price (float),
+                quantity and side (BID/ASK codes or "bid"/"ask" strings, str or bytes)
+                
+        Returns:
+            np.ndarray: Boolean array, False where the order ID already existed
+            (that order is skipped)
+        """
+        sides = orders["side"]
+        if sides.dtype.kind == "S":
+            # Byte strings (b"bid"/b"ask") never compare equal to str
+            sides = np.char.decode(sides, "ascii")
+        if sides.dtype.kind == "U":
+            is_bid = sides == "bid"
+            valid = is_bid | (sides == "ask")
+            sides = np.where(is_bid, BID, ASK)
+        else:
+            sides = np.asarray(sides, dtype=np.int64)
+            valid = (sides == BID) | (sides == ASK)
+        if not np.all(valid):
+            raise ValueError("Invalid side in batch. Must be BID/ASK or 'bid'/'ask'")
+        
+        prices_ticks = np.floor(orders["price"] * self._inv_tick + 0.5).astype(np.int64)
+        op_codes = np.full(len(orders), OP_ADD, dtype=np.int64)
+        return self.apply_events(op_codes, orders["order_id"], prices_ticks,
+                                 orders["quantity"], sides)
+    
     def lookup_order(self, order_id):
         """
         Lookup an order by its ID. O(1) operation.
@@ -158,71 +1085,84 @@ class OptimizedOrderBook:
         Returns:
             dict or None: The order dictionary if found, None otherwise
         """
-        return self.orders_by_id.get(order_id)
+        slot = self.orders_by_id.get(order_id)
+        if slot is None:
+            return None
+        return self._order_at(slot)
     
     def get_orders_at_price(self, price, side=None):
         """
-        Retrieve all orders at a given price level. O(1) operation.
+        Retrieve all orders at a given price level. O(k) for k orders at that price.
+        
+        In aggregate_only mode the level's totals are returned instead. O(1).
         
         Args:
             price (float): The price level to query
-            side (str, optional): "bid", "ask", or None. If None, returns orders from both sides.
+            side (int, optional): BID, ASK, or None. If None, returns orders from both sides.
             
         Returns:
-            list: List of orders at the specified price level
+            list: List of orders at the specified price level, or in aggregate_only
+            mode a (total_quantity, order_count) tuple summed over the queried sides
         """
-        result = []
+        if self.aggregate_only:
+            sentinels = self._levels_at(price, side)
+            order_ids, _, qty, _, _, _, _ = self._views
+            return (sum(qty[s] for s in sentinels),
+                    sum(order_ids[s] for s in sentinels))
         
-        if side is None or side == "bid":
-            if price in self.bids_by_price:
-                result.extend(self.bids_by_price[price])
+        return list(self.get_orders_at_price_view(price, side))
+    
+    def get_orders_at_price_view(self, price, side=None):
+        """
+        Iterate over the orders at a given price level without building a list.
         
-        if side is None or side == "ask":
-            if price in self.asks_by_price:
-                result.extend(self.asks_by_price[price])
+        The level is walked lazily, one order dict per step, so a caller that only
+        needs the first few orders stops early. O(1) to start. The book must not
+        be modified while the iterator is in use.
+        
+        Args:
+            price (float): The price level to query
+            side (int, optional): BID, ASK, or None. If None, yields bids then asks.
+            
+        Returns:
+            Iterator[dict]: Orders at the price level in time priority
+        """
+        if self.aggregate_only:
+            raise ValueError("Orders are not kept per level in aggregate_only mode")
         
-        return result
+        return chain.from_iterable(map(self._iter_level, self._levels_at(price, side)))
     
     def get_best_bid(self):
         """
-        Return the best (highest) bid. O(log n) amortized due to lazy deletion cleanup.
+        Return the best (highest) bid. O(1) from the cached best level.
         
         Returns:
             dict or None: The best bid order if bids exist, None otherwise
+            (in aggregate_only mode, the best bid level's aggregate dict)
         """
-        # Clean up deleted prices from heap (lazy deletion)
-        while self.bid_heap:
-            negated_price = self.bid_heap[0]
-            best_price = -negated_price
-            # Check if this price still exists in bids_by_price
-            if best_price in self.bids_by_price and self.bids_by_price[best_price]:
-                # Found valid best bid
-                return self.bids_by_price[best_price][0]  # Return first order at best price
-            else:
-                # This price was deleted, remove it from heap
-                heapq.heappop(self.bid_heap)
-        
-        return None
+        sentinel = self._best_level(BID)
+        if sentinel == _NO_LEVEL:
+            return None
+        if self.aggregate_only:
+            return self._level_at(sentinel)
+        # Highest price level, first order at that price
+        return self._order_at(self._views[4][sentinel])
     
     def get_best_ask(self):
         """
-        Return the best (lowest) ask. O(log n) amortized due to lazy deletion cleanup.
+        Return the best (lowest) ask. O(1) from the cached best level.
         
         Returns:
             dict or None: The best ask order if asks exist, None otherwise
+            (in aggregate_only mode, the best ask level's aggregate dict)
         """
-        # Clean up deleted prices from heap (lazy deletion)
-        while self.ask_heap:
-            best_price = self.ask_heap[0]
-            # Check if this price still exists in asks_by_price
-            if best_price in self.asks_by_price and self.asks_by_price[best_price]:
-                # Found valid best ask
-                return self.asks_by_price[best_price][0]  # Return first order at best price
-            else:
-                # This price was deleted, remove it from heap
-                heapq.heappop(self.ask_heap)
-        
-        return None
+        sentinel = self._best_level(ASK)
+        if sentinel == _NO_LEVEL:
+            return None
+        if self.aggregate_only:
+            return self._level_at(sentinel)
+        # Lowest price level, first order at that price
+        return self._order_at(self._views[4][sentinel])
     
     def get_best_bid_ask(self):
         """
@@ -232,6 +1172,208 @@ class OptimizedOrderBook:
             tuple: (best_bid, best_ask) where each is a dict or None
         """
         return (self.get_best_bid(), self.get_best_ask())
+    
+    def _top_n(self, side_code, n):
+        """
+        Build the depth snapshot of the n best price levels of a side.
+        
+        Args:
+            side_code (int): BID or ASK
+            n (int): Maximum number of price levels
+            
+        Returns:
+            np.ndarray: int64 array of shape (k, 3), k <= n, one row per level
+        """
+        sentinels = []
+        if n > 0:
+            for sentinel in self._levels_from_best(side_code):
+                if not self._level_is_empty(sentinel):
+                    sentinels.append(sentinel)
+                    if len(sentinels) == n:
+                        break
+        
+        depth = np.empty((len(sentinels), 3), dtype=np.int64)
+        for i, sentinel in enumerate(sentinels):
+            depth[i] = self._level_depth(sentinel)
+        return depth
+    
+    def _level_depth(self, sentinel):
+        """
+        Read one depth row for a price level off its sentinel.
+        
+        Args:
+            sentinel (int): Sentinel slot of the price level
+            
+        Returns:
+            tuple: (price ticks, total quantity, order count)
+        """
+        order_ids, price, qty, _, _, _, _ = self._views
+        return price[sentinel], qty[sentinel], order_ids[sentinel]
+    
+    def top_n_bids(self, n):
+        """
+        Return a depth snapshot of the n highest bid levels. O(n).
+        
+        Args:
+            n (int): Maximum number of price levels
+            
+        Returns:
+            np.ndarray: int64 array of shape (k, 3), k <= n, best level first; columns
+            are price ticks (price / tick_size), total quantity and order count
+        """
+        return self._top_n(BID, n)
+    
+    def top_n_asks(self, n):
+        """
+        Return a depth snapshot of the n lowest ask levels; see top_n_bids.
+        
+        Args:
+            n (int): Maximum number of price levels
+            
+        Returns:
+            np.ndarray: int64 array of shape (k, 3), k <= n, best level first
+        """
+        return self._top_n(ASK, n)
+
+
+class BoundedOrderBook(OptimizedOrderBook):
+    """
+    Order book for prices on a known, bounded tick grid (0 <= ticks < max_ticks).
+    
+    Instead of SortedDicts, each side keeps a flat list with one entry per tick
+    holding the sentinel slot of that price level (or _NO_LEVEL), so finding a
+    level is a single index instead of a hash probe.
+    
+    Occupied ticks are also kept as occupancy maps (bid_occupied, ask_occupied:
+    bytearrays where byte t is 1 iff that side has a level at tick t). The best
+    bid/ask are tracked with cursors (best_bid_tick, best_ask_tick) that move on
+    insert; when the best level empties, or top_n_bids/top_n_asks walk the book,
+    the next occupied tick is found with bytearray.rfind/find, a C byte scan over
+    the gap instead of a tick-by-tick Python loop.
+    
+    Time Complexities (differences from OptimizedOrderBook):
+    - add_order/delete_order: O(1) level lookup and occupancy update, no O(log n)
+      level insert/remove (emptying the best level scans the gap to the next one in C)
+    - get_best_bid/get_best_ask: O(1) - cursor lookup
+    """
+    
+    def __init__(self, max_ticks=65536, capacity=1024, aggregate_only=False,
+                 max_live_orders=None, tick_size=1e-4):
+        """
+        Initialize empty data structures.
+        
+        Args:
+            max_ticks (int): Size of the tick grid; prices must convert to ticks in [0, max_ticks)
+            capacity (int): Number of order slots to preallocate
+            aggregate_only (bool): Keep only per-level totals instead of time priority
+            max_live_orders (int, optional): If given, allow at most this many live
+                orders and preallocate a fixed pool for them (overrides capacity)
+                that never grows
+            tick_size (float): Price increment of one tick
+        """
+        # An empty grid would reject every add
+        if max_ticks < 1:
+            raise ValueError(f"max_ticks must be at least 1, got {max_ticks}")
+        
+        super().__init__(capacity, aggregate_only, max_live_orders, tick_size)
+        self.max_ticks = max_ticks
+        
+        # Direct-indexed price levels: ticks -> sentinel slot or _NO_LEVEL
+        self.bid_levels = [_NO_LEVEL] * max_ticks
+        self.ask_levels = [_NO_LEVEL] * max_ticks
+        
+        # Occupancy maps, byte t is 1 iff the level at tick t is open
+        self.bid_occupied = bytearray(max_ticks)
+        self.ask_occupied = bytearray(max_ticks)
+        
+        # Cursors to the best occupied ticks (past either end when the side is empty)
+        self.best_bid_tick = -1
+        self.best_ask_tick = max_ticks
+    
+    def _find_level(self, side_code, ticks):
+        if not 0 <= ticks < self.max_ticks:
+            return _NO_LEVEL
+        if side_code == BID:
+            return self.bid_levels[ticks]
+        return self.ask_levels[ticks]
+    
+    def _insert_level(self, side_code, ticks, sentinel):
+        if side_code == BID:
+            self.bid_levels[ticks] = sentinel
+            self.bid_occupied[ticks] = 1
+            if ticks > self.best_bid_tick:
+                self.best_bid_tick = ticks
+        else:
+            self.ask_levels[ticks] = sentinel
+            self.ask_occupied[ticks] = 1
+            if ticks < self.best_ask_tick:
+                self.best_ask_tick = ticks
+    
+    def _remove_level(self, side_code, ticks):
+        if side_code == BID:
+            self.bid_levels[ticks] = _NO_LEVEL
+            self.bid_occupied[ticks] = 0
+            if ticks == self.best_bid_tick:
+                self.best_bid_tick = self._next_bid_tick(ticks)
+        else:
+            self.ask_levels[ticks] = _NO_LEVEL
+            self.ask_occupied[ticks] = 0
+            if ticks == self.best_ask_tick:
+                self.best_ask_tick = self._next_ask_tick(ticks)
+    
+    def _best_level(self, side_code):
+        if side_code == BID:
+            if self.best_bid_tick < 0:
+                return _NO_LEVEL
+            return self.bid_levels[self.best_bid_tick]
+        if self.best_ask_tick >= self.max_ticks:
+            return _NO_LEVEL
+        return self.ask_levels[self.best_ask_tick]
+    
+    def _levels_from_best(self, side_code):
+        if side_code == BID:
+            ticks = self.best_bid_tick
+            while ticks >= 0:
+                yield self.bid_levels[ticks]
+                ticks = self._next_bid_tick(ticks)
+        else:
+            ticks = self.best_ask_tick
+            while ticks < self.max_ticks:
+                yield self.ask_levels[ticks]
+                ticks = self._next_ask_tick(ticks)
+    
+    def _next_bid_tick(self, ticks):
+        """Return the highest occupied bid tick below ticks, or -1."""
+        return self.bid_occupied.rfind(1, 0, ticks)
+    
+    def _next_ask_tick(self, ticks):
+        """Return the lowest occupied ask tick above ticks, or max_ticks."""
+        next_ticks = self.ask_occupied.find(1, ticks + 1)
+        return self.max_ticks if next_ticks < 0 else next_ticks
+    
+    def _check_ticks(self, ticks):
+        """Raise ValueError for an array of prices with any outside the tick grid."""
+        if np.any((ticks < 0) | (ticks >= self.max_ticks)):
+            raise ValueError(f"Price ticks must be in [0, {self.max_ticks})")
+    
+    def _add(self, order_id, ticks, quantity, side_code):
+        """Add an order given in internal units; the price must lie on the tick grid."""
+        # Plain comparisons for a single price; _check_ticks is for arrays
+        if not 0 <= ticks < self.max_ticks:
+            raise ValueError(f"Price ticks must be in [0, {self.max_ticks})")
+        super()._add(order_id, ticks, quantity, side_code)
+    
+    def apply_events(self, op_codes, ids, prices_ticks, qtys, sides):
+        """
+        Apply a batch of events in order; see OptimizedOrderBook.apply_events.
+        
+        Raises ValueError, before applying anything, if an add event has a price
+        outside the tick grid.
+        """
+        op_codes, ids, prices_ticks, qtys, sides = self._event_arrays(
+            op_codes, ids, prices_ticks, qtys, sides)
+        self._check_ticks(prices_ticks[op_codes == OP_ADD])
+        return super().apply_events(op_codes, ids, prices_ticks, qtys, sides)
 
 
 # Example usage and testing
@@ -240,12 +1382,12 @@ if __name__ == "__main__":
     ob = OptimizedOrderBook()
     
     # Add some orders
-    ob.add_order({"order_id": 1, "price": 100.0, "quantity": 10, "side": "bid"})
-    ob.add_order({"order_id": 2, "price": 101.0, "quantity": 5, "side": "bid"})
-    ob.add_order({"order_id": 3, "price": 99.0, "quantity": 8, "side": "bid"})
-    ob.add_order({"order_id": 4, "price": 102.0, "quantity": 15, "side": "ask"})
-    ob.add_order({"order_id": 5, "price": 103.0, "quantity": 12, "side": "ask"})
-    ob.add_order({"order_id": 6, "price": 101.0, "quantity": 7, "side": "ask"})
+    ob.add_order({"order_id": 1, "price": 100.0, "quantity": 10, "side": BID})
+    ob.add_order({"order_id": 2, "price": 101.0, "quantity": 5, "side": BID})
+    ob.add_order({"order_id": 3, "price": 99.0, "quantity": 8, "side": BID})
+    ob.add_order({"order_id": 4, "price": 102.0, "quantity": 15, "side": ASK})
+    ob.add_order({"order_id": 5, "price": 103.0, "quantity": 12, "side": ASK})
+    ob.add_order(Order(6, 101.0, 7, ASK))
     
     print("Best bid:", ob.get_best_bid())
     print("Best ask:", ob.get_best_ask())
@@ -0,0 +1,325 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Cython Order Book Implementation
+
+C-level port of BoundedOrderBook from optimized_orderbook.py:
+- Orders live in a pool of OrderNode structs (malloc'd, doubled on fill) with a
+  free-list stack of unused slots
+- Each price level is an intrusive circular doubly linked list of nodes around
+  a sentinel node, so cancels unlink in O(1)
+- Price levels are C arrays indexed by price tick (bounded tick grid), with
+  cursors to the best bid/ask
+- orders_by_id is a dict mapping order_id -> node slot
+
+Build with: python setup.py build_ext --inplace
+"""
+
+from libc.float cimport DBL_EPSILON
+from libc.math cimport fabs, floor, round
+from libc.stdint cimport int32_t, int64_t
+from libc.stdlib cimport free, malloc, realloc
+
+
+# Side codes, usable from C and exported to Python
+cpdef enum:
+    BID = 0
+    ASK = 1
+
+cdef int64_t NO_LEVEL = -1
+
+
+cdef struct OrderNode:
+    int64_t id
+    int64_t price  # price ticks
+    int64_t qty
+    int32_t side
+    int64_t prev  # slot of the previous node at this price level
+    int64_t next  # slot of the next node at this price level
+
+
+cdef class OptimizedOrderBook:
+    """
+    Order book for prices on a bounded tick grid (0 <= ticks < max_ticks).
+    
+    Data Structures:
+    - nodes: C array of OrderNode structs indexed by slot
+    - free_slots: C stack of unused slots
+    - bid_levels / ask_levels: C arrays mapping price ticks -> sentinel slot (or -1)
+    - best_bid_tick / best_ask_tick: cursors to the best occupied ticks
+    - orders_by_id: dict mapping order_id -> slot (O(1) lookup)
+    
+    Time Complexities:
+    - add_order: O(1) amortized
+    - amend_order: O(1)
+    - cancel: O(1), O(d) when it empties the best level (scan to the next occupied tick)
+    - lookup_order / best_bid / best_ask: O(1)
+    """
+    
+    cdef OrderNode* nodes
+    cdef int64_t* free_slots
+    cdef Py_ssize_t capacity
+    cdef Py_ssize_t free_count
+    cdef int64_t* bid_levels
+    cdef int64_t* ask_levels
+    cdef readonly int64_t max_ticks
+    cdef readonly int64_t best_bid_tick
+    cdef readonly int64_t best_ask_tick
+    cdef readonly double tick_size
+    cdef double inv_tick
+    cdef dict orders_by_id
+    
+    def __cinit__(self, int64_t max_ticks=65536, Py_ssize_t capacity=1024,
+                  double tick_size=1e-4):
+        """
+        Initialize empty data structures.
+        
+        Args:
+            max_ticks (int): Size of the tick grid; prices must convert to ticks in [0, max_ticks)
+            capacity (int): Number of node slots to preallocate
+            tick_size (float): Price increment of one tick
+        """
+        cdef Py_ssize_t i
+        cdef double nearest
+        
+        # malloc(0) may return NULL and _grow could never double an empty pool
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        if max_ticks < 1:
+            raise ValueError(f"max_ticks must be at least 1, got {max_ticks}")
+        
+        self.tick_size = tick_size
+        self.inv_tick = 1.0 / tick_size
+        # Snap a reciprocal that lands an ulp or so off its integer (1 / 1e-5 is
+        # 99999.99999999999) so prices rebuilt from ticks stay clean decimals
+        nearest = round(self.inv_tick)
+        if nearest != 0 and fabs(self.inv_tick - nearest) <= 4 * DBL_EPSILON * nearest:
+            self.inv_tick = nearest
+        self.max_ticks = max_ticks
+        self.capacity = capacity
+        self.orders_by_id = {}
+        
+        self.nodes = <OrderNode*> malloc(capacity * sizeof(OrderNode))
+        self.free_slots = <int64_t*> malloc(capacity * sizeof(int64_t))
+        self.bid_levels = <int64_t*> malloc(max_ticks * sizeof(int64_t))
+        self.ask_levels = <int64_t*> malloc(max_ticks * sizeof(int64_t))
+        if (self.nodes == NULL or self.free_slots == NULL
+                or self.bid_levels == NULL or self.ask_levels == NULL):
+            raise MemoryError()
+        
+        # Lowest slots are handed out first
+        for i in range(capacity):
+            self.free_slots[i] = capacity - 1 - i
+        self.free_count = capacity
+        
+        for i in range(max_ticks):
+            self.bid_levels[i] = NO_LEVEL
+            self.ask_levels[i] = NO_LEVEL
+        self.best_bid_tick = -1
+        self.best_ask_tick = max_ticks
+    
+    def __dealloc__(self):
+        free(self.nodes)
+        free(self.free_slots)
+        free(self.bid_levels)
+        free(self.ask_levels)
+    
+    def __len__(self):
+        return len(self.orders_by_id)
+    
+    cdef int _grow(self) except -1:
+        """Double the node pool and push the new slots onto the free list."""
+        cdef Py_ssize_t i
+        cdef Py_ssize_t new_capacity = self.capacity * 2
+        cdef OrderNode* nodes
+        cdef int64_t* free_slots
+        
+        # realloc to size 0 frees the buffer and returns NULL, which would leave
+        # a dangling pointer for __dealloc__ to free again
+        if new_capacity <= self.capacity:
+            raise MemoryError()
+        
+        # Each pointer is replaced only once its realloc has succeeded
+        nodes = <OrderNode*> realloc(self.nodes, new_capacity * sizeof(OrderNode))
+        if nodes == NULL:
+            raise MemoryError()
+        self.nodes = nodes
+        free_slots = <int64_t*> realloc(self.free_slots, new_capacity * sizeof(int64_t))
+        if free_slots == NULL:
+            raise MemoryError()
+        self.free_slots = free_slots
+        
+        for i in range(self.capacity):
+            self.free_slots[self.free_count + i] = new_capacity - 1 - i
+        self.free_count += self.capacity
+        self.capacity = new_capacity
+        return 0
+    
+    cdef int64_t _claim_slot(self) except -1:
+        """Pop a slot off the free list, growing the pool if none are left."""
+        if self.free_count == 0:
+            self._grow()
+        self.free_count -= 1
+        return self.free_slots[self.free_count]
+    
+    cdef inline void _release_slot(self, int64_t slot):
+        self.free_slots[self.free_count] = slot
+        self.free_count += 1
+    
+    cdef inline int64_t _to_ticks(self, double price):
+        # One multiply by the precomputed reciprocal, rounded to the nearest tick
+        return <int64_t> floor(price * self.inv_tick + 0.5)
+    
+    cdef dict _order_at(self, int64_t slot):
+        """Build the order dict for a slot."""
+        cdef OrderNode* node = &self.nodes[slot]
+        return {
+            "order_id": node.id,
+            "price": node.price / self.inv_tick,
+            "quantity": node.qty,
+            "side": node.side,
+        }
+    
+    cpdef add_order(self, int64_t order_id, double price, int64_t quantity, int side):
+        """
+        Add an order at the tail of its price level.
+        
+        Args:
+            order_id (int): Unique order identifier
+            price (float): Order price
+            quantity (int): Order quantity
+            side (int): BID or ASK
+        """
+        cdef int64_t ticks = self._to_ticks(price)
+        cdef int64_t* levels
+        cdef int64_t sentinel, slot, tail
+        cdef OrderNode* node
+        
+        if order_id in self.orders_by_id:
+            raise ValueError(f"Order ID {order_id} already exists")
+        if side != BID and side != ASK:
+            raise ValueError(f"Invalid side: {side}. Must be BID or ASK")
+        if ticks < 0 or ticks >= self.max_ticks:
+            raise ValueError(f"Price ticks must be in [0, {self.max_ticks})")
+        
+        levels = self.bid_levels if side == BID else self.ask_levels
+        
+        # Open the price level with an empty circular list around a new sentinel
+        sentinel = levels[ticks]
+        if sentinel == NO_LEVEL:
+            sentinel = self._claim_slot()
+            self.nodes[sentinel].price = ticks
+            self.nodes[sentinel].side = side
+            self.nodes[sentinel].prev = sentinel
+            self.nodes[sentinel].next = sentinel
+            levels[ticks] = sentinel
+            if side == BID:
+                if ticks > self.best_bid_tick:
+                    self.best_bid_tick = ticks
+            elif ticks < self.best_ask_tick:
+                self.best_ask_tick = ticks
+        
+        slot = self._claim_slot()
+        node = &self.nodes[slot]
+        node.id = order_id
+        node.price = ticks
+        node.qty = quantity
+        node.side = side
+        
+        # Append to the tail of the price level (FIFO time priority)
+        tail = self.nodes[sentinel].prev
+        self.nodes[tail].next = slot
+        node.prev = tail
+        node.next = sentinel
+        self.nodes[sentinel].prev = slot
+        
+        self.orders_by_id[order_id] = slot
+    
+    cpdef bint amend_order(self, int64_t order_id, int64_t new_quantity):
+        """
+        Update an order's quantity.
+        
+        Returns:
+            bool: True if order was found and amended, False otherwise
+        """
+        slot = self.orders_by_id.get(order_id)
+        if slot is None:
+            return False
+        self.nodes[<int64_t> slot].qty = new_quantity
+        return True
+    
+    cpdef bint cancel(self, int64_t order_id):
+        """
+        Remove an order from the book.
+        
+        Returns:
+            bool: True if order was found and deleted, False otherwise
+        """
+        cdef int64_t slot, prev_slot, next_slot, ticks
+        cdef int64_t* levels
+        
+        found = self.orders_by_id.pop(order_id, None)
+        if found is None:
+            return False
+        slot = found
+        
+        # Unlink the node; the sentinel makes this branch-free
+        prev_slot = self.nodes[slot].prev
+        next_slot = self.nodes[slot].next
+        self.nodes[prev_slot].next = next_slot
+        self.nodes[next_slot].prev = prev_slot
+        self._release_slot(slot)
+        
+        # Only the sentinel is left on both sides once the level is empty
+        if prev_slot == next_slot:
+            ticks = self.nodes[slot].price
+            if self.nodes[slot].side == BID:
+                levels = self.bid_levels
+                levels[ticks] = NO_LEVEL
+                if ticks == self.best_bid_tick:
+                    while ticks >= 0 and levels[ticks] == NO_LEVEL:
+                        ticks -= 1
+                    self.best_bid_tick = ticks
+            else:
+                levels = self.ask_levels
+                levels[ticks] = NO_LEVEL
+                if ticks == self.best_ask_tick:
+                    while ticks < self.max_ticks and levels[ticks] == NO_LEVEL:
+                        ticks += 1
+                    self.best_ask_tick = ticks
+            self._release_slot(next_slot)
+        
+        return True
+    
+    cpdef lookup_order(self, int64_t order_id):
+        """
+        Lookup an order by its ID.
+        
+        Returns:
+            dict or None: The order dictionary if found, None otherwise
+        """
+        slot = self.orders_by_id.get(order_id)
+        if slot is None:
+            return None
+        return self._order_at(slot)
+    
+    cpdef best_bid(self):
+        """
+        Return the best (highest) bid.
+        
+        Returns:
+            dict or None: The first order at the highest bid price, None if there are no bids
+        """
+        if self.best_bid_tick < 0:
+            return None
+        return self._order_at(self.nodes[self.bid_levels[self.best_bid_tick]].next)
+    
+    cpdef best_ask(self):
+        """
+        Return the best (lowest) ask.
+        
+        Returns:
+            dict or None: The first order at the lowest ask price, None if there are no asks
+        """
+        if self.best_ask_tick >= self.max_ticks:
+            return None
+        return self._order_at(self.nodes[self.ask_levels[self.best_ask_tick]].next)
@@ -0,0 +1,22 @@
+"""
+Build the Cython order book extension (orderbook.pyx) in place:
+
+    python setup.py build_ext --inplace
+"""
+
+from Cython.Build import cythonize
+from setuptools import Extension, setup
+
+
+extensions = [
+    Extension(
+        "orderbook",
+        ["orderbook.pyx"],
+        extra_compile_args=["-O3", "-march=native"],
+    ),
+]
+
+setup(
+    name="orderbook",
+    ext_modules=cythonize(extensions),
+)
@@ -0,0 +1,504 @@
+"""
+Tests for optimized_orderbook.py
+
+Run with: python -m unittest test_optimized_orderbook
+"""
+
+import random
+import unittest
+
+import numpy as np
+
+from optimized_orderbook import (ASK, BID, OP_ADD, OP_AMEND, OP_DELETE, BoundedOrderBook,
+                                 OptimizedOrderBook, Order)
+
+
+def _free_count(book):
+    """Number of free slots in a book's pool."""
+    return int(book._free_count[0])
+
+
+class ReferenceBook:
+    """
+    Straightforward model of the book to compare against.
+    
+    orders keeps each live order as order_id -> [ticks, quantity, side] in
+    insertion order, which is time priority within a price level.
+    """
+    
+    def __init__(self, max_live_orders=None):
+        self.max_live_orders = max_live_orders
+        self.orders = {}
+    
+    def apply(self, op_code, order_id, ticks, quantity, side):
+        """Apply one event and return whether it took effect."""
+        if op_code == OP_ADD:
+            if order_id in self.orders:
+                return False
+            if self.max_live_orders is not None and len(self.orders) >= self.max_live_orders:
+                return False
+            self.orders[order_id] = [ticks, quantity, side]
+        elif op_code == OP_AMEND:
+            if order_id not in self.orders:
+                return False
+            self.orders[order_id][1] = quantity
+        else:
+            if order_id not in self.orders:
+                return False
+            del self.orders[order_id]
+        return True
+    
+    def levels(self, side):
+        """Return {ticks: [order_id, ...]} for a side, orders in time priority."""
+        levels = {}
+        for order_id, (ticks, _, order_side) in self.orders.items():
+            if order_side == side:
+                levels.setdefault(ticks, []).append(order_id)
+        return levels
+    
+    def depth(self, side):
+        """Return the depth rows for a side, best level first."""
+        levels = self.levels(side)
+        return [[ticks, sum(self.orders[i][1] for i in levels[ticks]), len(levels[ticks])]
+                for ticks in sorted(levels, reverse=side == BID)]
+
+
+def random_events(seed, num_events, num_prices=20):
+    """Generate a random add/amend/delete stream, including duplicates and unknown IDs."""
+    rng = random.Random(seed)
+    events = []
+    live = []
+    next_id = 0
+    for _ in range(num_events):
+        r = rng.random()
+        if r < 0.5 or not live:
+            if rng.random() < 0.05 and live:
+                order_id = rng.choice(live)  # duplicate
+            else:
+                order_id = next_id
+                next_id += 1
+                live.append(order_id)
+            ticks = 999_990 + rng.randrange(num_prices)
+            events.append((OP_ADD, order_id, ticks, rng.randint(1, 9), rng.randrange(2)))
+        elif r < 0.7:
+            order_id = rng.choice(live) if rng.random() < 0.9 else next_id + 1000
+            events.append((OP_AMEND, order_id, 0, rng.randint(1, 9), 0))
+        else:
+            if rng.random() < 0.9:
+                order_id = live.pop(rng.randrange(len(live)))
+            else:
+                order_id = next_id + 1000
+            events.append((OP_DELETE, order_id, 0, 0, 0))
+    return events
+
+
+class TestInvalidAdd(unittest.TestCase):
+    """An add that is rejected must leave the book exactly as it was."""
+    
+    BAD_ORDERS = [
+        {"order_id": 10, "price": 100.0, "quantity": np.float64(3.0), "side": BID},
+        {"order_id": 10, "price": 100.0, "quantity": 1.5, "side": BID},
+        {"order_id": "10", "price": 100.0, "quantity": 3, "side": BID},
+        {"order_id": 2**63, "price": 100.0, "quantity": 3, "side": BID},
+        {"order_id": 10, "price": 100.0, "quantity": -2**63 - 1, "side": BID},
+        {"order_id": 10, "price": 1e20, "quantity": 3, "side": BID},
+    ]
+    
+    def check_rejected(self, book):
+        book.add_order({"order_id": 1, "price": 99.0, "quantity": 5, "side": BID})
+        free_count = _free_count(book)
+        for order in self.BAD_ORDERS:
+            with self.subTest(order=order):
+                with self.assertRaises((TypeError, ValueError)):
+                    book.add_order(order)
+                self.assertEqual(_free_count(book), free_count)
+                self.assertEqual(book.get_best_bid()["order_id"], 1)
+                self.assertEqual(book.get_orders_at_price(100.0, BID), [])
+                self.assertIsNone(book.lookup_order(10))
+        
+        # The book still takes a valid order at the same price
+        book.add_order({"order_id": 10, "price": 100.0, "quantity": 3, "side": BID})
+        self.assertEqual(book.get_best_bid()["order_id"], 10)
+    
+    def test_unbounded(self):
+        self.check_rejected(OptimizedOrderBook())
+    
+    def test_bounded(self):
+        self.check_rejected(BoundedOrderBook(max_ticks=2_000_000))
+    
+    def test_numpy_integers_accepted(self):
+        book = OptimizedOrderBook()
+        book.add_order({"order_id": np.int64(7), "price": 100.0,
+                        "quantity": np.int32(4), "side": ASK})
+        self.assertEqual(book.lookup_order(7)["quantity"], 4)
+        self.assertTrue(book.delete_order(7))
+
+
+class TestLevelTotals(unittest.TestCase):
+    """Depth snapshots read the totals the sentinel keeps in every mode."""
+    
+    def check_totals(self, book):
+        book.add_order({"order_id": 1, "price": 100.0, "quantity": 5, "side": BID})
+        book.add_order({"order_id": 2, "price": 100.0, "quantity": 7, "side": BID})
+        book.add_order({"order_id": 3, "price": 99.0, "quantity": 4, "side": BID})
+        book.add_order({"order_id": 4, "price": 101.0, "quantity": 2, "side": ASK})
+        book.amend_order(2, 9)
+        book.delete_order(1)
+        book.apply_events([0, 1, 2], [5, 3, 4], [990000, 0, 0], [6, 1, 0], [BID, 0, 0])
+        
+        self.assertEqual(book.top_n_bids(5).tolist(), [[1000000, 9, 1], [990000, 7, 2]])
+        self.assertEqual(book.top_n_asks(5).tolist(), [])
+    
+    def test_linked(self):
+        self.check_totals(OptimizedOrderBook())
+    
+    def test_aggregate_only(self):
+        self.check_totals(OptimizedOrderBook(aggregate_only=True))
+    
+    def test_bounded(self):
+        self.check_totals(BoundedOrderBook(max_ticks=2_000_000))
+
+
+class TestAddOrdersBatch(unittest.TestCase):
+    """A snapshot loads with sides given as codes, str or bytes."""
+    
+    def snapshot(self, side_dtype, sides):
+        orders = np.zeros(3, dtype=[("order_id", np.int64), ("price", np.float64),
+                                    ("quantity", np.int64), ("side", side_dtype)])
+        orders["order_id"] = [1, 2, 3]
+        orders["price"] = [100.0, 101.0, 99.5]
+        orders["quantity"] = [5, 6, 7]
+        orders["side"] = sides
+        return orders
+    
+    def check_loaded(self, orders):
+        book = OptimizedOrderBook()
+        self.assertEqual(book.add_orders_batch(orders).tolist(), [True, True, True])
+        self.assertEqual(book.get_best_bid()["order_id"], 3)
+        self.assertEqual(book.get_best_ask()["order_id"], 1)
+    
+    def test_side_codes(self):
+        self.check_loaded(self.snapshot(np.int8, [ASK, ASK, BID]))
+    
+    def test_str_sides(self):
+        self.check_loaded(self.snapshot("U3", ["ask", "ask", "bid"]))
+    
+    def test_bytes_sides(self):
+        self.check_loaded(self.snapshot("S3", [b"ask", b"ask", b"bid"]))
+    
+    def test_invalid_side(self):
+        for side_dtype, sides in (("U3", ["ask", "buy", "bid"]),
+                                  ("S3", [b"ask", b"buy", b"bid"]),
+                                  (np.int8, [ASK, 2, BID])):
+            with self.subTest(side_dtype=side_dtype):
+                book = OptimizedOrderBook()
+                with self.assertRaises(ValueError):
+                    book.add_orders_batch(self.snapshot(side_dtype, sides))
+                self.assertEqual(book.orders_by_id, {})
+
+
+class TestApplyEventsInput(unittest.TestCase):
+    """apply_events rejects malformed batches before applying any event."""
+    
+    def test_non_integer_arrays(self):
+        for args in (([0], [5], [100.7], [2], [0]),
+                     ([0], [5], [100], [2.5], [0]),
+                     ([0], ["5"], [100], [2], [0]),
+                     ([0.0], [5], [100], [2], [0])):
+            with self.subTest(args=args):
+                book = OptimizedOrderBook()
+                with self.assertRaises(ValueError):
+                    book.apply_events(*args)
+                self.assertEqual(book.orders_by_id, {})
+    
+    def test_mismatched_lengths(self):
+        book = OptimizedOrderBook()
+        with self.assertRaises(ValueError):
+            book.apply_events([0, 0], [1, 2], [100], [1, 1], [BID, BID])
+        self.assertEqual(book.orders_by_id, {})
+    
+    def test_invalid_add_side(self):
+        book = OptimizedOrderBook()
+        with self.assertRaises(ValueError):
+            book.apply_events([0, 0], [1, 2], [100, 101], [1, 1], [BID, 5])
+        self.assertEqual(book.orders_by_id, {})
+    
+    def test_integer_inputs_accepted(self):
+        book = OptimizedOrderBook()
+        self.assertEqual(book.apply_events([], [], [], [], []).tolist(), [])
+        applied = book.apply_events(np.array([0], dtype=np.int8), np.array([5], dtype=np.uint32),
+                                    [100], [2], [ASK])
+        self.assertEqual(applied.tolist(), [True])
+        self.assertEqual(book.lookup_order(5)["quantity"], 2)
+
+
+class TestAgainstReference(unittest.TestCase):
+    """
+    The single-operation methods, apply_events and BoundedOrderBook all apply the
+    same random event stream as ReferenceBook.
+    """
+    
+    CONFIGS = [
+        (OptimizedOrderBook, {}),
+        (OptimizedOrderBook, {"aggregate_only": True}),
+        (OptimizedOrderBook, {"max_live_orders": 30}),
+        (OptimizedOrderBook, {"aggregate_only": True, "max_live_orders": 30}),
+        (OptimizedOrderBook, {"capacity": 1}),
+        (BoundedOrderBook, {"max_ticks": 1_000_100}),
+        (BoundedOrderBook, {"max_ticks": 1_000_100, "aggregate_only": True}),
+        (BoundedOrderBook, {"max_ticks": 1_000_100, "max_live_orders": 30}),
+    ]
+    
+    def assert_matches(self, book, reference):
+        self.assertEqual(set(book.orders_by_id), set(reference.orders))
+        self.assertTrue(all(map(book._level_is_empty, book._dead_levels)))
+        for order_id, (ticks, quantity, side) in reference.orders.items():
+            order = book.lookup_order(order_id)
+            self.assertEqual((round(order["price"] * 1e4), order["quantity"], order["side"]),
+                             (ticks, quantity, side))
+        
+        for side, top_n, get_best in ((BID, book.top_n_bids, book.get_best_bid),
+                                      (ASK, book.top_n_asks, book.get_best_ask)):
+            depth = reference.depth(side)
+            self.assertEqual(top_n(len(depth) + 1).tolist(), depth)
+            best = get_best()
+            if not depth:
+                self.assertIsNone(best)
+                continue
+            ticks, quantity, count = depth[0]
+            if book.aggregate_only:
+                self.assertEqual((round(best["price"] * 1e4), best["quantity"],
+                                  best["order_count"]), (ticks, quantity, count))
+                continue
+            self.assertEqual(best["order_id"], reference.levels(side)[ticks][0])
+            for level_ticks, order_ids in reference.levels(side).items():
+                orders = book.get_orders_at_price(level_ticks / 1e4, side)
+                self.assertEqual([order["order_id"] for order in orders], order_ids)
+    
+    def run_single(self, book, reference, events):
+        for i, (op_code, order_id, ticks, quantity, side) in enumerate(events):
+            if op_code == OP_ADD:
+                try:
+                    book.add_order(Order(order_id, ticks / 1e4, quantity, side))
+                    applied = True
+                except ValueError:
+                    applied = False
+            elif op_code == OP_AMEND:
+                applied = book.amend_order(order_id, quantity)
+            else:
+                applied = book.delete_order(order_id)
+            self.assertEqual(applied, reference.apply(op_code, order_id, ticks, quantity, side))
+            if i % 50 == 0:
+                self.assert_matches(book, reference)
+        self.assert_matches(book, reference)
+    
+    def run_batches(self, book, reference, events, seed):
+        rng = random.Random(seed)
+        start = 0
+        while start < len(events):
+            batch = events[start:start + rng.randint(1, 80)]
+            start += len(batch)
+            applied = book.apply_events(*(np.array(column, dtype=np.int64)
+                                          for column in zip(*batch)))
+            self.assertEqual(applied.tolist(), [reference.apply(*event) for event in batch])
+            self.assert_matches(book, reference)
+    
+    def test_single_operations(self):
+        for seed, (cls, kwargs) in enumerate(self.CONFIGS):
+            with self.subTest(cls=cls.__name__, **kwargs):
+                book = cls(**kwargs)
+                reference = ReferenceBook(kwargs.get("max_live_orders"))
+                self.run_single(book, reference, random_events(seed, 1500))
+    
+    def test_apply_events(self):
+        for seed, (cls, kwargs) in enumerate(self.CONFIGS):
+            with self.subTest(cls=cls.__name__, **kwargs):
+                book = cls(**kwargs)
+                reference = ReferenceBook(kwargs.get("max_live_orders"))
+                self.run_batches(book, reference, random_events(seed, 1500), seed)
+    
+    def test_mixed(self):
+        # Single operations and batches interleaved on one book
+        for seed, (cls, kwargs) in enumerate(self.CONFIGS):
+            with self.subTest(cls=cls.__name__, **kwargs):
+                book = cls(**kwargs)
+                reference = ReferenceBook(kwargs.get("max_live_orders"))
+                events = random_events(seed, 1600)
+                for start in range(0, len(events), 400):
+                    self.run_single(book, reference, events[start:start + 200])
+                    self.run_batches(book, reference, events[start + 200:start + 400], seed)
+
+
+class TestConstructorArguments(unittest.TestCase):
+    
+    def test_capacity_must_be_positive(self):
+        # An empty pool used to double to 0 forever on the first add
+        for cls, kwargs in ((OptimizedOrderBook, {}), (BoundedOrderBook, {"max_ticks": 10})):
+            for capacity in (0, -1):
+                with self.subTest(cls=cls.__name__, capacity=capacity):
+                    with self.assertRaises(ValueError):
+                        cls(capacity=capacity, **kwargs)
+    
+    def test_max_ticks_must_be_positive(self):
+        for max_ticks in (0, -1):
+            with self.subTest(max_ticks=max_ticks):
+                with self.assertRaises(ValueError):
+                    BoundedOrderBook(max_ticks=max_ticks)
+    
+    def test_max_live_orders_must_be_positive(self):
+        for max_live_orders in (0, -1):
+            with self.subTest(max_live_orders=max_live_orders):
+                with self.assertRaises(ValueError):
+                    OptimizedOrderBook(max_live_orders=max_live_orders)
+    
+    def test_capacity_one_grows(self):
+        book = OptimizedOrderBook(capacity=1)
+        for order_id in range(10):
+            book.add_order({"order_id": order_id, "price": 100.0 + order_id,
+                            "quantity": 1, "side": BID})
+        self.assertEqual(book.get_best_bid()["order_id"], 9)
+
+
+class TestMaxLiveOrders(unittest.TestCase):
+    """max_live_orders caps live orders and the pool never grows."""
+    
+    def test_single_add_past_limit(self):
+        book = OptimizedOrderBook(max_live_orders=100)
+        for order_id in range(100):
+            book.add_order({"order_id": order_id, "price": 100.0, "quantity": 1, "side": BID})
+        with self.assertRaises(ValueError):
+            book.add_order({"order_id": 100, "price": 100.0, "quantity": 1, "side": BID})
+        self.assertEqual(len(book.orders_by_id), 100)
+        
+        book.delete_order(0)
+        book.add_order({"order_id": 100, "price": 100.0, "quantity": 1, "side": BID})
+        self.assertEqual(len(book.orders_by_id), 100)
+        self.assertEqual(len(book.qty), 200)
+    
+    def test_batch_add_past_limit(self):
+        for cls, kwargs in ((OptimizedOrderBook, {}), (BoundedOrderBook, {"max_ticks": 70_000})):
+            with self.subTest(cls=cls.__name__):
+                book = cls(max_live_orders=100, **kwargs)
+                for order_id in range(98):
+                    book.add_order({"order_id": order_id, "price": 1.0 + order_id * 1e-4,
+                                    "quantity": 1, "side": BID})
+                
+                # Adds at new prices, only two of which fit
+                num_adds = 6
+                applied = book.apply_events(np.full(num_adds, OP_ADD),
+                                            np.arange(1000, 1000 + num_adds),
+                                            np.arange(num_adds) * 7 + 50_000,
+                                            np.ones(num_adds, dtype=np.int64),
+                                            np.full(num_adds, ASK))
+                self.assertEqual(applied.tolist(), [True, True, False, False, False, False])
+                self.assertEqual(len(book.orders_by_id), 100)
+                
+                # Each delete makes room for the add after it, each at a new price
+                op_codes, ids, prices_ticks = [], [], []
+                for k in range(50):
+                    op_codes += [OP_DELETE, OP_ADD]
+                    ids += [k, 2000 + k]
+                    prices_ticks += [0, 60_000 + k]
+                num_events = len(op_codes)
+                applied = book.apply_events(op_codes, ids, prices_ticks,
+                                            np.ones(num_events, dtype=np.int64),
+                                            np.full(num_events, ASK))
+                self.assertTrue(applied.all())
+                self.assertEqual(len(book.orders_by_id), 100)
+                self.assertEqual(len(book.qty), 200)
+    
+    def test_churn_does_not_grow_pool(self):
+        # Dead levels are compacted instead of growing a fixed pool
+        book = OptimizedOrderBook(max_live_orders=10)
+        for order_id in range(1000):
+            book.add_order({"order_id": order_id, "price": 100.0 + order_id * 1e-4,
+                            "quantity": 1, "side": ASK})
+            if order_id >= 5:
+                book.delete_order(order_id - 5)
+        self.assertEqual(len(book.qty), 20)
+        self.assertEqual(book.get_best_ask()["order_id"], 995)
+
+
+class TestDeadLevels(unittest.TestCase):
+    """A dead level that gets an order again is no longer counted as dead."""
+    
+    def check_revived(self, book, refill):
+        # Enough live orders that 40 dead levels stay under the compaction threshold
+        for order_id in range(1000, 1200):
+            book.add_order({"order_id": order_id, "price": 200.0, "quantity": 1, "side": BID})
+        for order_id in range(1, 41):
+            book.add_order({"order_id": order_id, "price": 100.0 + order_id,
+                            "quantity": 1, "side": BID})
+            book.delete_order(order_id)
+        self.assertEqual(len(book._dead_levels), 40)
+        
+        refill(book)
+        self.assertEqual(book._dead_levels, set())
+    
+    def test_single_add(self):
+        def refill(book):
+            for order_id in range(41, 81):
+                book.add_order({"order_id": order_id, "price": 60.0 + order_id,
+                                "quantity": 1, "side": BID})
+        
+        self.check_revived(OptimizedOrderBook(), refill)
+    
+    def test_apply_events(self):
+        def refill(book):
+            num_adds = 40
+            book.apply_events(np.full(num_adds, OP_ADD), np.arange(41, 81),
+                              np.arange(1_010_000, 1_410_000, 10_000),
+                              np.ones(num_adds, dtype=np.int64), np.full(num_adds, BID))
+        
+        self.check_revived(OptimizedOrderBook(), refill)
+
+
+class TestTickSize(unittest.TestCase):
+    
+    def test_prices_round_trip(self):
+        # 1 / 1e-5 is 99999.99999999999, which used to rebuild 100.0 as 100.00000000000001
+        for tick_size in (1e-5, 1e-4, 0.01, 0.05, 0.25):
+            with self.subTest(tick_size=tick_size):
+                book = OptimizedOrderBook(tick_size=tick_size)
+                book.add_order({"order_id": 1, "price": 100.0, "quantity": 1, "side": BID})
+                self.assertEqual(book.lookup_order(1)["price"], 100.0)
+
+
+class TestOrderRecord(unittest.TestCase):
+    
+    def test_order_subclass(self):
+        class TaggedOrder(Order):
+            __slots__ = ("tag",)
+        
+        book = OptimizedOrderBook()
+        book.add_order(TaggedOrder(1, 100.0, 3, ASK))
+        self.assertEqual(book.lookup_order(1)["quantity"], 3)
+
+
+try:
+    import orderbook
+except ImportError:
+    orderbook = None
+
+
+@unittest.skipIf(orderbook is None, "Cython extension not built (see setup.py)")
+class TestCythonBook(unittest.TestCase):
+    
+    def test_empty_pool_rejected(self):
+        # realloc to size 0 used to free the pool and leave it to be freed again
+        with self.assertRaises(ValueError):
+            orderbook.OptimizedOrderBook(capacity=0)
+        with self.assertRaises(ValueError):
+            orderbook.OptimizedOrderBook(max_ticks=0)
+    
+    def test_pool_grows(self):
+        book = orderbook.OptimizedOrderBook(max_ticks=1000, capacity=1)
+        for order_id in range(50):
+            book.add_order(order_id, order_id * 1e-3, 1, orderbook.BID)
+        self.assertEqual(book.best_bid()["order_id"], 49)
+        self.assertTrue(book.cancel(49))
+        self.assertEqual(book.best_bid()["order_id"], 48)
+
+
+if __name__ == "__main__":
+    unittest.main()